@@ -11,103 +11,322 @@ Notes:
   to parsing the 'describe' string.
 - Outputs human-readable units and the value in farads.
 - Basic on-disk cache to avoid repeated HTTP calls.
+- Uncached IDs are fetched concurrently via aiohttp when it is installed;
+  otherwise a paced serial loop over requests is used.
 
 Python ≥3.8
 """
 
-import re
+import os
+import sys
 import json
+import mmap
+import bisect
 import time
+import asyncio
 import argparse
+import functools
+import multiprocessing
+from operator import itemgetter
 from pathlib import Path
 from typing import Optional, Tuple, List, Dict
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None  # serial requests loop only
+
+try:
+    import re2 as _re  # google-re2: DFA matcher, linear time in the input
+except ImportError:
+    import re as _re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # stdlib json fallback
+
+try:
+    import simdjson  # pysimdjson: on-demand parse, only touched keys are materialized
+    _PARSER = simdjson.Parser()
+except ImportError:
+    simdjson = None
 
 API = "https://cart.jlcpcb.com/shoppingCart/smtGood/getComponentDetail?componentCode={code}"
 UA  = "Mozilla/5.0 (+cap_list)"
-CAP_RE = re.compile(r"(?P<val>\d+(?:\.\d+)?)\s*(?P<u>f|uf|μf|nf|pf)", re.I)
+MAX_CONCURRENCY = 64  # in-flight requests against the JLC host
+MAX_RETRIES = 4
+POOL_MIN_IDS = 256    # below this, worker start-up costs more than the parallel parse saves
+
+# shared keep-alive pool for the serial path: one TCP+TLS handshake per host, not per part
+_SESSION = requests.Session()
+_SESSION.headers.update({"User-Agent": UA})
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=MAX_CONCURRENCY, pool_maxsize=MAX_CONCURRENCY,
+    # connection errors only: fetch_lcsc retries 429/5xx itself, through the token bucket
+    max_retries=Retry(total=3, backoff_factor=0.3, raise_on_status=False,
+                      respect_retry_after_header=False),
+))
+
+# numbered groups + inline flag so the pattern compiles under both re2 and re
+CAP_RE = _re.compile(r"(?i)(\d+(?:\.\d+)?)\s*(f|uf|μf|nf|pf)")
+
+# both U+03BC (GREEK SMALL LETTER MU) and U+00B5 (MICRO SIGN) appear in JLC data
+_MULT = {"f": 1.0, "uf": 1e-6, "μf": 1e-6, "µf": 1e-6, "nf": 1e-9, "pf": 1e-12}
 
 def to_farads(val: float, unit: str) -> float:
-    u = unit.lower().replace("μ", "u")
-    if u == "f":   return val
-    if u == "uf":  return val * 1e-6
-    if u == "nf":  return val * 1e-9
-    if u == "pf":  return val * 1e-12
-    # fallback
-    return val
-
-def parse_cap_from_text(text: str) -> Optional[float]:
-    if not text:
-        return None
-    m = CAP_RE.search(text)
-    if not m:
-        return None
-    return to_farads(float(m.group("val")), m.group("u"))
+    # unknown units fall back to the bare value
+    return val * _MULT.get(unit.lower(), 1.0)
+
+# free-text fields of the JLC payload, in priority order after the attribute
+_CAND_KEYS = ("describe", "componentModelEn", "componentSpecificationEn")
+
+def _loads(data) -> Dict:
+    # orjson takes any buffer (bytes, memoryview of an mmap); stdlib json wants bytes
+    return orjson.loads(data) if orjson else json.loads(bytes(data))
 
-def fetch_lcsc(code: str, timeout: float = 10.0, cache_dir: Optional[Path] = None) -> Dict:
+def _dumps(j: Dict, pretty: bool = False) -> bytes:
+    if orjson:
+        opt = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(j, option=opt)
+    if pretty:
+        return json.dumps(j, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(j, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _slim(doc) -> Dict:
     """
-    Return the raw JSON dict from the API (with top-level 'data'), or {} on failure.
-    Uses a simple JSON cache if cache_dir is provided.
+    Keep only the fields the extractor reads (works on dicts and simdjson objects).
+    Pricing, stock, images etc. are never converted to Python objects.
     """
-    if cache_dir:
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        cpath = cache_dir / f"{code}.json"
-        if cpath.exists():
-            try:
-                return json.loads(cpath.read_text(encoding="utf-8"))
-            except Exception:
-                pass
+    d = doc.get("data")
+    if not d:
+        return {}
+    out = {k: d.get(k) for k in ("componentCode", *_CAND_KEYS)}
+    out["attributes"] = [
+        {"attribute_name_en": a.get("attribute_name_en"), "attribute_value_name": a.get("attribute_value_name")}
+        for a in d.get("attributes") or ()
+    ]
+    return {"data": out}
 
+def _parse_payload(data) -> Dict:
+    if simdjson:
+        return _slim(_PARSER.parse(data))
+    return _slim(_loads(data))
+
+@functools.lru_cache(maxsize=4096)
+def _load_cached(path_str: str, mtime_ns: int, size: int) -> Dict:
+    """
+    Parse one cache file (memoized per path + mtime + size; treat the result as read-only).
+    Raises on unreadable/corrupt files, so failures are never memoized.
+    The file is mapped and parsed straight from the page cache, with no intermediate bytes copy.
+    """
+    with open(path_str, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):  # mmap unsupported here
+            return _parse_payload(f.read())
+        with mm, memoryview(mm) as mv:
+            return _parse_payload(mv)
+
+def _read_cache(cpath: Path) -> Optional[Dict]:
+    """Parsed cache entry, or None if missing, empty or unreadable (misses are not memoized)."""
     try:
-        r = requests.get(API.format(code=code), headers={"User-Agent": UA}, timeout=timeout)
-        if r.status_code != 200:
-            return {}
-        j = r.json()
-        if cache_dir:
-            (cache_dir / f"{code}.json").write_text(json.dumps(j, ensure_ascii=False, indent=2), encoding="utf-8")
-        return j
+        st = os.stat(cpath)
+        if not st.st_size:
+            return None
+        # a rewritten entry has a new mtime/size, so it is a new key: no invalidation needed
+        return _load_cached(str(cpath), st.st_mtime_ns, st.st_size)
     except Exception:
+        return None
+
+def _write_cache(cpath: Path, j: Dict, pretty: bool = False, etag: Optional[str] = None) -> None:
+    """
+    Write via a temp file + os.replace so a crash never leaves a truncated entry.
+    The server's ETag, if it sent one, goes to <code>.etag for later If-None-Match requests.
+    """
+    if not j:
+        return
+    tmp = cpath.with_suffix(".json.tmp")
+    tmp.write_bytes(_dumps(j, pretty))
+    os.replace(tmp, cpath)
+    epath = cpath.with_suffix(".etag")
+    if etag:
+        epath.write_text(etag, encoding="utf-8")
+    else:
+        epath.unlink(missing_ok=True)  # a validator for an older body must not be sent
+
+def _revalidate_headers(cpath: Optional[Path], cached: Optional[Dict]) -> Dict[str, str]:
+    if cpath is None or cached is None:
+        return {}
+    try:
+        return {"If-None-Match": cpath.with_suffix(".etag").read_text(encoding="utf-8").strip()}
+    except OSError:
         return {}
 
+class TokenBucket:
+    """
+    Token bucket on the monotonic clock: refills at `rate` tokens per second up to
+    `capacity`, so idle time (e.g. cache hits) banks credit for later bursts.
+    Tokens are reserved up front; a caller that goes into debt sleeps it off.
+    """
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = max(rate, 0.1)
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+
+    def _reserve(self) -> float:
+        """Take one token; return how long the caller must wait before using it."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate) - 1
+        self.last = now
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def wait(self) -> None:
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire(self) -> None:
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+def fetch_lcsc(code: str, timeout: float = 10.0, cache_dir: Optional[Path] = None,
+               pretty: bool = False, bucket: Optional[TokenBucket] = None,
+               refresh: bool = False) -> Dict:
+    """
+    Return the API JSON trimmed to the fields read here (see _slim), or {} on failure.
+    Cache hits return the memoized parse shared by every caller: do not mutate the result.
+    Uses a simple JSON cache if cache_dir is provided (compact unless pretty=True).
+    The cache directory must already exist (main() creates it once).
+    With refresh=True a cached entry is revalidated with If-None-Match; on 304
+    (or any failure) the cached copy is returned.
+    If a bucket is given, only actual HTTP requests are paced by it.
+    """
+    cpath = Path(cache_dir, code + ".json") if cache_dir else None
+    cached = _read_cache(cpath) if cpath else None
+    if cached is not None and not refresh:
+        return cached
+    fallback = cached if cached is not None else {}
+
+    headers = _revalidate_headers(cpath, cached)
+    for attempt in range(MAX_RETRIES):
+        if attempt:
+            time.sleep(0.5 * 2 ** (attempt - 1))
+        if bucket:
+            bucket.wait()  # every attempt is paced, retries included
+        try:
+            r = _SESSION.get(API.format(code=code), timeout=timeout, headers=headers)
+            if r.status_code == 429 or r.status_code >= 500:
+                continue
+            if r.status_code != 200:  # incl. 304 Not Modified
+                return fallback
+            j = _parse_payload(r.content)
+            if cpath:
+                _write_cache(cpath, j, pretty, etag=r.headers.get("ETag"))
+            return j
+        except Exception:
+            return fallback
+    return fallback
+
+async def fetch_lcsc_async(session, code: str, sem: asyncio.Semaphore, bucket: TokenBucket,
+                           cache_dir: Optional[Path] = None, pretty: bool = False,
+                           refresh: bool = False) -> Dict:
+    """
+    Async counterpart of fetch_lcsc (same cache layout and refresh semantics;
+    cache hits are likewise shared and must not be mutated).
+    The cache is checked before the first await so hits never touch the network;
+    non-200 responses and timeouts are retried with exponential backoff.
+    """
+    cpath = Path(cache_dir, code + ".json") if cache_dir else None
+    cached = _read_cache(cpath) if cpath else None
+    if cached is not None and not refresh:
+        return cached
+    headers = _revalidate_headers(cpath, cached)
+
+    async with sem:
+        for attempt in range(MAX_RETRIES):
+            if attempt:
+                await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+            await bucket.acquire()
+            try:
+                async with session.get(API.format(code=code), headers=headers) as r:
+                    if r.status == 304 and cached is not None:
+                        return cached
+                    if r.status != 200:
+                        continue
+                    body = await r.read()
+                    etag = r.headers.get("ETag")
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                continue
+            try:
+                j = _parse_payload(body)
+            except ValueError:  # truncated/garbled body: try again
+                continue
+            except Exception:  # e.g. valid JSON that isn't an object: retrying won't help
+                break
+            if cpath:
+                try:
+                    _write_cache(cpath, j, pretty, etag=etag)
+                except OSError:
+                    break  # same as fetch_lcsc: an unwritable cache yields the fallback
+            return j
+    return cached if cached is not None else {}
+
+def _extract_impl(d: Dict) -> Optional[float]:
+    _search = CAP_RE.search
+    v0 = next((a.get("attribute_value_name") for a in d.get("attributes") or ()
+               if (a.get("attribute_name_en") or "").lower() == "capacitance"), None)
+    for s in (v0, *map(d.get, _CAND_KEYS)):
+        if s and (m := _search(s)):
+            return to_farads(float(m.group(1)), m.group(2))
+    return None
+
+class _ByCode:
+    """Hashable handle on a payload: hashes/compares by componentCode only."""
+    __slots__ = ("code", "d")
+
+    def __init__(self, code: str, d: Optional[Dict]):
+        self.code = code
+        self.d = d
+
+    def __hash__(self) -> int:
+        return hash(self.code)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, _ByCode) and self.code == other.code
+
+@functools.lru_cache(maxsize=4096)
+def _extract_cached(key: _ByCode) -> Optional[float]:
+    d, key.d = key.d, None  # the key is kept by the cache; don't pin the payload
+    return _extract_impl(d)
+
 def extract_capacitance_f(api_json: Dict) -> Optional[float]:
     """
     Try structured attributes first, then free text.
+    Memoized per componentCode: a hit never looks at the payload.
     """
     d = (api_json or {}).get("data") or {}
-    # 1) structured attributes
-    attrs = d.get("attributes") or []
-    for a in attrs:
-        name = (a.get("attribute_name_en") or "").strip().lower()
-        if name == "capacitance":
-            v = (a.get("attribute_value_name") or "").strip()
-            cap_f = parse_cap_from_text(v)
-            if cap_f is not None:
-                return cap_f
-    # 2) description
-    desc = d.get("describe") or ""
-    cap_f = parse_cap_from_text(desc)
-    if cap_f is not None:
-        return cap_f
-    # 3) model/spec fields sometimes contain it
-    for k in ("componentModelEn", "componentSpecificationEn"):
-        cap_f = parse_cap_from_text(d.get(k) or "")
-        if cap_f is not None:
-            return cap_f
-    return None
+    code = d.get("componentCode")
+    if code:
+        return _extract_cached(_ByCode(code, d))
+    return _extract_impl(d)
+
+_SI = ((1e-12, "pF"), (1e-9, "nF"), (1e-6, "µF"), (1e-3, "mF"), (1.0, "F"))
+_SI_EDGES = tuple(d for d, _ in _SI[1:])  # lower bound of every bucket above pF
 
 def fmt_si_f(F: float) -> str:
-    if F >= 1:
-        return f"{F:g} F"
-    if F >= 1e-3:
-        return f"{F*1e3:g} mF"
-    if F >= 1e-6:
-        return f"{F*1e6:g} µF"
-    if F >= 1e-9:
-        return f"{F*1e9:g} nF"
-    return f"{F*1e12:g} pF"
-
-DEFAULT_IDS = [
+    # bisect on the exact thresholds: no float log10 rounding at decade edges
+    d, s = _SI[bisect.bisect_right(_SI_EDGES, F)]
+    return f"{F/d:g} {s}"
+
+# interned: the IDs double as cache/memo keys and compare by identity first
+DEFAULT_IDS = tuple(sys.intern(c) for c in (
 "C1523","C1525","C1530","C1532","C1538","C1546","C1547","C1548","C1549","C1554",
 "C1555","C1562","C1567","C1588","C1594","C1603","C1604","C1613","C1620","C1622",
 "C1623","C1631","C1634","C1644","C1647","C1648","C1653","C1658","C1663","C1664",
@@ -117,44 +336,75 @@ DEFAULT_IDS = [
 "C21117","C21120","C21122","C23630","C23733","C24497","C28233","C28260","C28323","C29823",
 "C32949","C38523","C45783","C46653","C49678","C50254","C52923","C53134","C53987","C57112",
 "C59461","C96123","C96446","C107145","C307331","C377773","C440198","C1322360"
-]
+))
+
+async def run_all(args, codes: List[str]) -> List[Dict]:
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    bucket = TokenBucket(args.rate)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(headers={"User-Agent": UA}, timeout=timeout) as session:
+        return await asyncio.gather(*[
+            fetch_lcsc_async(session, code, sem, bucket, cache_dir=args.cache,
+                             pretty=args.pretty_cache, refresh=args.refresh)
+            for code in codes
+        ])
+
+def _extract_worker(code: str, cache_dir: str) -> Tuple[str, Optional[float]]:
+    """Pool task: parse one cached payload and extract its capacitance."""
+    j = _read_cache(Path(cache_dir, code + ".json"))
+    return code, extract_capacitance_f(j or {})
 
 def main():
     ap = argparse.ArgumentParser(description="List capacitance for LCSC capacitor IDs (sorted ascending).")
     ap.add_argument("--ids", nargs="*", default=DEFAULT_IDS, help="LCSC IDs (default: built-in list)")
     ap.add_argument("--timeout", type=float, default=10.0, help="HTTP timeout seconds")
     ap.add_argument("--cache", type=Path, default=Path(".lcsc_cache_cap"), help="Cache directory")
-    ap.add_argument("--rate", type=float, default=6.0, help="Max requests per second (simple pacing)")
+    ap.add_argument("--refresh", action="store_true",
+                    help="Revalidate cached parts with the server (If-None-Match; 304 keeps the cache)")
+    ap.add_argument("--pretty-cache", action="store_true", help="Indent cached JSON (debugging)")
+    ap.add_argument("--rate", type=float, default=6.0, help="Max requests per second (token bucket)")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                    help=f"Worker processes for extraction (used from {POOL_MIN_IDS} IDs up, with a cache)")
     args = ap.parse_args()
+    args.ids = [sys.intern(c) for c in args.ids]
 
-    min_dt = 1.0 / max(args.rate, 0.1)
-    last = 0.0
+    if args.cache:
+        args.cache.mkdir(parents=True, exist_ok=True)
 
-    results: List[Tuple[str, Optional[float]]] = []
-    for code in args.ids:
-        # pacing
-        now = time.time()
-        dt = now - last
-        if dt < min_dt:
-            time.sleep(min_dt - dt)
-        last = time.time()
+    # 1) fetch; when extraction is pooled, only cache misses are fetched (and parsed) here
+    pooled = bool(args.cache) and args.jobs > 1 and len(args.ids) >= POOL_MIN_IDS
+    if pooled and not args.refresh:
+        # same test as fetch_lcsc: a corrupt or empty entry counts as a miss and is refetched
+        codes = [c for c in args.ids if _read_cache(Path(args.cache, c + ".json")) is None]
+    else:
+        codes = list(args.ids)
+    if aiohttp is not None:
+        jsons = asyncio.run(run_all(args, codes))
+    else:
+        bucket = TokenBucket(args.rate)
+        jsons = [fetch_lcsc(code, timeout=args.timeout, cache_dir=args.cache, pretty=args.pretty_cache,
+                            bucket=bucket, refresh=args.refresh) for code in codes]
 
-        j = fetch_lcsc(code, timeout=args.timeout, cache_dir=args.cache)
-        cap_f = extract_capacitance_f(j)
-        results.append((code, cap_f))
+    # 2) extract: CPU-bound and independent per part
+    results: List[Tuple[str, Optional[float]]]
+    if pooled:
+        worker = functools.partial(_extract_worker, cache_dir=str(args.cache))
+        with multiprocessing.Pool(args.jobs) as pool:
+            results = pool.map(worker, args.ids, chunksize=16)
+    else:
+        results = [(code, extract_capacitance_f(j)) for code, j in zip(codes, jsons)]
 
     # separate known vs unknown, sort known by F ascending
-    known = [(c, f) for c, f in results if f is not None]
+    known = sorted(((c, f) for c, f in results if f is not None), key=itemgetter(1))
     unknown = [c for c, f in results if f is None]
-    known.sort(key=lambda x: x[1])
 
-    # print
-    for code, F in known:
-        print(f"{code:>9s}  {fmt_si_f(F):>10s}  ({F:.12g} F)")
+    # print, as a single write
+    lines = [f"{code:>9s}  {fmt_si_f(F):>10s}  ({F:.12g} F)" for code, F in known]
     if unknown:
-        print("\n# No capacitance parsed for:")
-        for code in unknown:
-            print(code)
+        lines.append("\n# No capacitance parsed for:")
+        lines.extend(unknown)
+    if lines:
+        print("\n".join(lines))
 
 if __name__ == "__main__":
     main()
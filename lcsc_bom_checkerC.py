@@ -31,38 +31,184 @@ Notes:
 # python3 lcsc_bom_checker.py BOM-lyeonsSA3.csv --out report.csv --cache .lcsc_cache
 
 from __future__ import annotations
-import argparse, csv, json, os, re, sys, time, math, hashlib
+import argparse, asyncio, csv, json, os, re, sqlite3, sys, time, math, hashlib, threading
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import urlsplit
+from email.utils import parsedate_to_datetime
 from dataclasses import dataclass
+from functools import lru_cache
 from difflib import SequenceMatcher
 from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 except Exception:
     requests = None  # for offline use
 
+try:
+    import aiohttp  # concurrent prefetch of uncached parts
+except Exception:
+    aiohttp = None  # thread pool + requests only
+
+try:
+    import orjson  # faster JSON for cache reads/writes
+except Exception:
+    orjson = None
+
+if orjson is not None:
+    _loads = orjson.loads
+    def _dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    _dumps_compact = orjson.dumps  # SQLite BLOBs: no indentation, no re-encoding
+else:
+    _loads = json.loads  # accepts bytes too
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    def _dumps_compact(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+try:
+    import hyperscan  # optional multi-pattern prefilter for the footprint regexes
+except Exception:
+    hyperscan = None
+
 API_URL = "https://cart.jlcpcb.com/shoppingCart/smtGood/getComponentDetail?componentCode={code}"
 UA = "Mozilla/5.0 (LCSC BOM checker)"
 
+def _make_session() -> "requests.Session":
+    # one keep-alive pool for the single JLC host: the TLS handshake is paid once, not per row
+    s = requests.Session()
+    s.headers.update({"User-Agent": UA})
+    s.mount("https://", HTTPAdapter(
+        pool_connections=1, pool_maxsize=20,
+        # connection errors only: 429/5xx responses come back to fetch_lcsc, which
+        # retries them through the token bucket and applies Retry-After (capped) there
+        max_retries=Retry(total=2, backoff_factor=0.3, raise_on_status=False,
+                          respect_retry_after_header=False),
+    ))
+    return s
+
+_SESSION = _make_session() if requests is not None else None
+
+def _prewarm(session, timeout: float) -> None:
+    """Open a keep-alive connection to the API host (DNS + TCP + TLS) before the first row needs it."""
+    parts = urlsplit(API_URL)
+    try:
+        session.head(f"{parts.scheme}://{parts.netloc}/", timeout=timeout, allow_redirects=False)
+    except Exception:
+        pass  # best effort; the real request reports any network problem
+
+class TokenBucket:
+    """
+    Thread-safe token bucket on the monotonic clock: refills at `rate` tokens per
+    second up to `capacity`, so `rate` requests/s on average with bursts of up to
+    `capacity`. A caller that takes the bucket into debt sleeps it off outside the lock.
+    """
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = max(rate, 0.001)
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take one token; return how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate) - 1
+            self.last = now
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def acquire(self) -> None:
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        """Server asked us to back off: no token is handed out for `seconds` (e.g. from Retry-After)."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.tokens = min(self.tokens, -seconds * self.rate)
+            self.last = now
+
+MAX_BACKOFF = 60.0  # cap on a server-requested pause, seconds
+
+def _retry_after(headers) -> Optional[float]:
+    """Seconds to wait from a 429/503's Retry-After or X-RateLimit-Reset header; None if absent/unparseable."""
+    v = headers.get("Retry-After")
+    if v:
+        try:
+            delay = float(v)
+        except ValueError:
+            try:  # HTTP-date form
+                delay = parsedate_to_datetime(v).timestamp() - time.time()
+            except (TypeError, ValueError):
+                delay = None
+        if delay is not None:
+            return min(max(delay, 0.0), MAX_BACKOFF)
+    v = headers.get("X-RateLimit-Reset")
+    if v:
+        try:
+            reset = float(v)
+        except ValueError:
+            return None
+        # either an epoch timestamp or a number of seconds from now
+        delay = reset - time.time() if reset > 1e9 else reset
+        return min(max(delay, 0.0), MAX_BACKOFF)
+    return None
+
 # ---- Utilities ----------------------------------------------------------------
 PKG_RE = re.compile(r"\b(0[40612]{3}|1206|1210|2010|2512)\b")
-CAP_RE = re.compile(r"(?P<val>\d+(\.\d+)?)\s*(?P<u>f|uf|μf|nf|pf)\b", re.I)
-RES_RE = re.compile(
-    r"(?P<val>\d+(?:\.\d+)?)\s*"
-    r"(?P<u>(?:m|k|meg)?\s*ohm|[km]Ω|mΩ|Ω)"
-    r"(?=$|[^0-9A-Za-z_])",
+# Per-field pieces, shared by the lcsc_describe patterns below and by MASTER_RE
+_NUM = r"\d+(?:\.\d+)?"
+_CAP_U = r"f|uf|μf|nf|pf"
+_RES_U = r"(?:m|k|meg)?\s*ohm|[km]Ω|mΩ|Ω"
+_RES_END = r"(?=$|[^0-9A-Za-z_])"
+_IND_U = r"uh|μh|nh|h"
+_DIEL = r"C0G|NP0|X7R|X5R|Y5V|X6S|X7S|X8R"
+
+CAP_RE = re.compile(rf"(?P<val>{_NUM})\s*(?P<u>{_CAP_U})\b", re.I)
+VOLT_RE = re.compile(rf"(?P<v>{_NUM})\s*V\b", re.I)
+DIELECTRIC_RE = re.compile(rf"\b({_DIEL})\b", re.I)
+
+# bound .search methods, so the per-row hot paths skip the global + attribute lookup
+_PKG_SEARCH = PKG_RE.search
+_CAP_SEARCH = CAP_RE.search
+_VOLT_SEARCH = VOLT_RE.search
+_DIELECTRIC_SEARCH = DIELECTRIC_RE.search
+
+# All comment fields in one alternation, so parse_comment walks the string once.
+# Units never overlap (V / % / W / F / ohm / H), so at most one branch can match
+# at a given position and the first hit per kind equals a separate search for
+# that field alone.  The dielectric branch is a zero-width lookahead so the
+# trailing digit of e.g. "NP0" stays available to the numeric branches.
+MASTER_RE = re.compile(
+    r"(?=[\d±CNXY])(?:"
+    rf"(?P<volt>{_NUM})\s*V\b"
+    rf"|±\s*(?P<tol>{_NUM})\s*%\b"
+    rf"|(?P<pow>{_NUM})\s*(?P<powu>W|mW)\b"
+    rf"|\b(?=(?P<diel>{_DIEL})\b)"
+    rf"|(?P<cap>{_NUM})\s*(?P<capu>{_CAP_U})\b"
+    rf"|(?P<res>{_NUM})\s*(?P<resu>{_RES_U}){_RES_END}"
+    rf"|(?P<ind>{_NUM})\s*(?P<indu>{_IND_U})\b"
+    r")",
     re.I
 )
-IND_RE = re.compile(r"(?P<val>\d+(\.\d+)?)\s*(?P<u>uh|μh|nh|h)\b", re.I)
-VOLT_RE = re.compile(r"(?P<v>\d+(\.\d+)?)\s*V\b", re.I)
-POW_RE = re.compile(r"(?P<p>\d+(\.\d+)?)(\s*(W|mW))\b", re.I)
-TOL_RE = re.compile(r"±\s*(?P<t>\d+(\.\d+)?)\s*%\b")
-DIELECTRIC_RE = re.compile(r"\b(C0G|NP0|X7R|X5R|Y5V|X6S|X7S|X8R)\b", re.I)
+_MASTER_FINDITER = MASTER_RE.finditer
 
 def norm_pkg(s: Optional[str]) -> Optional[str]:
     if not s: return None
-    m = PKG_RE.search(s.replace(" ", ""))
+    m = _PKG_SEARCH(s.replace(" ", ""))
     return m.group(1) if m else None
 
 def norm_cap(val: float, unit: str) -> float:
@@ -95,7 +241,7 @@ def nearly_equal(a: float, b: float, rel=0.05, abs_tol=0.0) -> bool:
     if a is None or b is None: return False
     return abs(a - b) <= max(rel * max(abs(a), abs(b)), abs_tol)
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ParsedComment:
     package: Optional[str] = None
     voltage_v: Optional[float] = None
@@ -107,94 +253,232 @@ class ParsedComment:
     ind_h: Optional[float] = None
     raw: str = ""
 
+@lru_cache(maxsize=4096)
 def parse_comment(s: str) -> ParsedComment:
-    p = ParsedComment(raw=s or "")
+    # memoised: BOMs repeat comments a lot; the result is frozen so the cached
+    # instance can't be altered by a caller
     if not s:
-        return p
-    # package
-    p.package = norm_pkg(s)
-    # voltage
-    m = VOLT_RE.search(s)
-    if m: p.voltage_v = float(m.group("v"))
-    # tol
-    m = TOL_RE.search(s)
-    if m: p.tolerance_pct = float(m.group("t"))
-    # power
-    m = POW_RE.search(s)
-    if m:
-        val = float(m.group("p"))
-        unit = m.group(4).lower()
-        p.power_w = val/1000.0 if unit == "mw" else val
-    # dielectric
-    m = DIELECTRIC_RE.search(s)
-    if m: p.dielectric = m.group(1).upper().replace("NP0","C0G")
-    # cap
-    m = CAP_RE.search(s)
-    if m:
-        p.cap_f = norm_cap(float(m.group("val")), m.group("u"))
-    # res
-    m = RES_RE.search(s)
-    if m:
-        p.res_ohm = norm_res(float(m.group("val")), m.group("u"))
-    # ind
-    m = IND_RE.search(s)
-    if m:
-        p.ind_h = norm_ind(float(m.group("val")), m.group("u"))
+        return ParsedComment(raw=s or "")
+    _float = float
+    # package (matched on the space-stripped string, so it stays a separate search)
+    package = norm_pkg(s)
+    volt = tol = power = diel = cap = res = ind = None
+    # everything else in a single pass; the first match of each kind wins
+    seen = set()
+    for m in _MASTER_FINDITER(s):
+        kind = m.lastgroup
+        if kind in seen:
+            continue
+        seen.add(kind)
+        if kind == "volt":
+            volt = _float(m.group("volt"))
+        elif kind == "tol":
+            tol = _float(m.group("tol"))
+        elif kind == "powu":
+            val = _float(m.group("pow"))
+            power = val/1000.0 if m.group("powu").lower() == "mw" else val
+        elif kind == "diel":
+            diel = m.group("diel").upper().replace("NP0","C0G")
+        elif kind == "capu":
+            cap = norm_cap(_float(m.group("cap")), m.group("capu"))
+        elif kind == "resu":
+            res = norm_res(_float(m.group("res")), m.group("resu"))
+        elif kind == "indu":
+            ind = norm_ind(_float(m.group("ind")), m.group("indu"))
+        if len(seen) == 7:
+            break
+
+    return ParsedComment(package, volt, tol, power, diel, cap, res, ind, s)
 
+# ---- LCSC API -----------------------------------------------------------------
 
-    return p
+def index_json_dir(d: Path) -> Dict[str, Path]:
+    """Map LCSC code -> cached JSON path with a single directory scan."""
+    with os.scandir(d) as it:
+        return {e.name[:-5]: Path(e.path) for e in it if e.name.endswith(".json")}
 
-# ---- LCSC API -----------------------------------------------------------------
+class LcscCache:
+    """
+    LCSC responses in one SQLite file, <cache_dir>/lcsc.sqlite: code -> (fetched_at, json BLOB).
+    Legacy one-file-per-code JSONs in the same directory are still read, and are
+    imported (with their mtime as fetched_at) on first use. Rows older than `ttl`
+    seconds count as misses (ttl=0: never expire). One connection, shared by the
+    worker threads behind a lock.
+    """
+    def __init__(self, cache_dir: Path, ttl: float = 0.0):
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(cache_dir / "lcsc.sqlite"), isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS parts ("
+                         "code TEXT PRIMARY KEY, fetched_at INTEGER NOT NULL, json BLOB NOT NULL)")
+        self._legacy = index_json_dir(cache_dir)
+
+    def _oldest(self) -> int:
+        return int(time.time() - self.ttl) if self.ttl > 0 else 0
+
+    def _put(self, code: str, fetched_at: int, j: Dict[str, Any]) -> None:
+        blob = _dumps_compact(j)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO parts (code, fetched_at, json) VALUES (?, ?, ?)",
+                             (code, fetched_at, blob))
+
+    def has(self, code: str) -> bool:
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM parts WHERE code = ? AND fetched_at >= ?",
+                                   (code, self._oldest())).fetchone()
+        if row:
+            return True
+        path = self._legacy.get(code)
+        return path is not None and path.stat().st_mtime >= self._oldest()
+
+    def get(self, code: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT json FROM parts WHERE code = ? AND fetched_at >= ?",
+                                   (code, self._oldest())).fetchone()
+        if row:
+            return _loads(row[0])
+        path = self._legacy.get(code)
+        if path is None:
+            return None
+        fetched_at = int(path.stat().st_mtime)
+        if fetched_at < self._oldest():
+            return None
+        j = _loads(path.read_bytes())
+        self._put(code, fetched_at, j)
+        return j
+
+    def set(self, code: str, j: Dict[str, Any]) -> None:
+        self._put(code, int(time.time()), j)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+MAX_RETRIES = 3
 
 def fetch_lcsc(code: str, timeout: float, cache_dir: Optional[Path]=None,
-               offline_json_dir: Optional[Path]=None) -> Dict[str, Any]:
+               offline_json_dir: Optional[Path]=None, session=None,
+               bucket: Optional[TokenBucket]=None,
+               cache: Optional[LcscCache]=None, refresh: bool=False) -> Dict[str, Any]:
     """
     Returns a dict with keys: success (bool), data (dict) or msg (str)
+    Lookups go to `cache` (unless `refresh`), then to the legacy per-file
+    `offline_json_dir`, then HTTP; HTTP results are stored in `cache`, or as
+    JSON files in `cache_dir` when there is no cache.
+    HTTP goes through `session` (default: the shared module-level session);
+    only HTTP requests take a `bucket` token, offline hits return immediately.
+    Safe to call from worker threads.
     """
     code = code.strip()
     # Offline path first
-    if offline_json_dir:
+    data = None
+    if cache is not None and not refresh:
+        data = cache.get(code)
+    elif offline_json_dir:
         cand = offline_json_dir / f"{code}.json"
         if cand.exists():
-            with cand.open("r", encoding="utf-8") as f:
-                data = json.load(f)
-            ok = bool(data.get("data"))
-            return {"success": ok, "data": data if ok else None, "msg": None if ok else "no data in JSON"}
-    # # Cache
-    # j = None
-    # if cache_dir:
-    #     cache_dir.mkdir(parents=True, exist_ok=True)
-    #     cache_path = cache_dir / f"{code}.json"
-    #     if cache_path.exists():
-    #         try:
-    #             j = json.loads(cache_path.read_text(encoding="utf-8"))
-    #             if j.get("data"):  # valid
-    #                 return {"success": True, "data": j}
-    #         except Exception:
-    #             pass
+            data = _loads(cand.read_bytes())
+    if data is not None:
+        ok = bool(data.get("data"))
+        return {"success": ok, "data": data if ok else None, "msg": None if ok else "no data in JSON"}
     # HTTP
     if requests is None:
         return {"success": False, "msg": "requests not available (offline environment)"}
     url = API_URL.format(code=code)
-    headers = {"User-Agent": UA}
-    try:
-        print(f"fetching LCSC {code} ...")
-        r = requests.get(url, headers=headers, timeout=timeout)
-        if r.status_code != 200:
-            return {"success": False, "msg": f"HTTP {r.status_code}"}
-        j = r.json()
-        if not j.get("data"):
-            return {"success": False, "msg": "no 'data' in response"}
-        # cache
-        if cache_dir:
-            (cache_dir / f"{code}.json").write_text(json.dumps(j, ensure_ascii=False, indent=2), encoding="utf-8")
-        # print(j)
-        return {"success": True, "data": j}
-    except Exception as e:
-        return {"success": False, "msg": f"request error: {e}"}
+    session = session or _SESSION
+    msg = "no response"
+    # 429/5xx are retried here rather than in the adapter, so every attempt takes a token
+    for attempt in range(MAX_RETRIES):
+        if attempt:
+            time.sleep(0.5 * 2 ** (attempt - 1))
+        if bucket:
+            bucket.acquire()
+        try:
+            # stderr: worker threads must not interleave with the per-row report on stdout
+            print(f"fetching LCSC {code} ...", file=sys.stderr)
+            r = session.get(url, timeout=timeout)
+            if r.status_code != 200:
+                msg = f"HTTP {r.status_code}"
+                if r.status_code == 429 or r.status_code >= 500:
+                    delay = _retry_after(r.headers)
+                    if bucket and delay:
+                        bucket.pause(delay)  # hold back the other workers too
+                    continue
+                return {"success": False, "msg": msg}
+            j = _loads(r.content)
+            if not j.get("data"):
+                return {"success": False, "msg": "no 'data' in response"}
+            # cache
+            if cache is not None:
+                cache.set(code, j)
+            elif cache_dir:
+                (cache_dir / f"{code}.json").write_bytes(_dumps(j))
+            return {"success": True, "data": j}
+        except Exception as e:
+            return {"success": False, "msg": f"request error: {e}"}
+    return {"success": False, "msg": msg}
+
+async def fetch_lcsc_async(session, code: str, sem: asyncio.Semaphore, bucket: TokenBucket,
+                           cache: Optional[LcscCache]=None) -> Dict[str, Any]:
+    """
+    HTTP half of fetch_lcsc on aiohttp, same result dict; successes go into `cache`.
+    429/5xx responses and network errors are retried with exponential backoff.
+    """
+    msg = "no response"
+    async with sem:
+        for attempt in range(MAX_RETRIES):
+            if attempt:
+                await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+            await bucket.acquire_async()
+            print(f"fetching LCSC {code} ...", file=sys.stderr)
+            try:
+                async with session.get(API_URL.format(code=code)) as r:
+                    if r.status != 200:
+                        msg = f"HTTP {r.status}"
+                        if r.status == 429 or r.status >= 500:
+                            delay = _retry_after(r.headers)
+                            if delay:
+                                bucket.pause(delay)  # every pending request waits, not just this one
+                            continue
+                        return {"success": False, "msg": msg}
+                    j = _loads(await r.read())
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                msg = f"request error: {e!r}"
+                continue
+            try:
+                if not j.get("data"):
+                    return {"success": False, "msg": "no 'data' in response"}
+                if cache is not None:
+                    cache.set(code, j)
+                return {"success": True, "data": j}
+            except Exception as e:
+                # non-object JSON, cache write error, ...: fail this part only, like fetch_lcsc
+                return {"success": False, "msg": f"request error: {e}"}
+    return {"success": False, "msg": msg}
+
+async def prefetch_all(codes: Iterable[str], timeout: float, bucket: TokenBucket,
+                       cache: Optional[LcscCache]=None) -> Dict[str, Dict[str, Any]]:
+    """Fetch all `codes` concurrently (bounded by a semaphore and `bucket`); code -> fetch_lcsc-style result."""
+    codes = list(codes)
+    sem = asyncio.Semaphore(16)
+    connector = aiohttp.TCPConnector(limit_per_host=8)
+    async with aiohttp.ClientSession(headers={"User-Agent": UA}, connector=connector,
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        results = await asyncio.gather(*[
+            fetch_lcsc_async(session, code, sem, bucket, cache=cache)
+            for code in codes
+        ])
+    return dict(zip(codes, results))
 
 # ---- Extractors from LCSC JSON ------------------------------------------------
 
+# attributes lcsc_describe() normalises into voltage_v / cap_f / dielectric
+_WANT = frozenset(("voltage rating", "capacitance", "temperature coefficient"))
+
 def lcsc_describe(blob: Dict[str, Any]) -> Dict[str, Any]:
     """Extract normalised fields from LCSC JSON."""
     d = blob.get("data", {})
@@ -205,35 +489,42 @@ def lcsc_describe(blob: Dict[str, Any]) -> Dict[str, Any]:
         "model": d.get("componentModelEn") or None,
         "attributes": {},
     }
-    attrs = d.get("attributes") or []
-    for a in attrs:
-        k = (a.get("attribute_name_en") or "").strip().lower()
-        v = (a.get("attribute_value_name") or "").strip()
-        if k:
-            out["attributes"][k] = v
+    # one pass: keep every attribute (extract_signals scans them all for package
+    # hints) and pick up the ones in _WANT on the way
+    attrs = d.get("attributes")
+    picked: Dict[str, str] = {}
+    if attrs:
+        attributes = out["attributes"]
+        for a in attrs:
+            k = (a.get("attribute_name_en") or "").strip().lower()
+            if not k:
+                continue
+            v = attributes[k] = (a.get("attribute_value_name") or "").strip()
+            if k in _WANT:
+                picked[k] = v
+    volt = picked.get("voltage rating")
+    cap = picked.get("capacitance")
+    diel = picked.get("temperature coefficient")
     # Attempt to normalise common fields
     # Voltage
-    volt = out["attributes"].get("voltage rating")
     if volt:
-        m = VOLT_RE.search(volt)
+        m = _VOLT_SEARCH(volt)
         out["voltage_v"] = float(m.group("v")) if m else None
     else:
-        m = VOLT_RE.search(out["describe"])
+        m = _VOLT_SEARCH(out["describe"])
         out["voltage_v"] = float(m.group("v")) if m else None
     # Capacitance
-    cap = out["attributes"].get("capacitance")
     if cap:
-        m = CAP_RE.search(cap)
+        m = _CAP_SEARCH(cap)
         out["cap_f"] = norm_cap(float(m.group("val")), m.group("u")) if m else None
     else:
-        m = CAP_RE.search(out["describe"])
+        m = _CAP_SEARCH(out["describe"])
         out["cap_f"] = norm_cap(float(m.group("val")), m.group("u")) if m else None
     # Dielectric (temperature coefficient)
-    diel = out["attributes"].get("temperature coefficient")
     if diel:
         out["dielectric"] = diel.upper().replace("NP0","C0G")
     else:
-        m = DIELECTRIC_RE.search(out["describe"])
+        m = _DIELECTRIC_SEARCH(out["describe"])
         out["dielectric"] = m.group(1).upper().replace("NP0","C0G") if m else None
     # Package
     if out["package"]:
@@ -254,9 +545,30 @@ def lcsc_describe(blob: Dict[str, Any]) -> Dict[str, Any]:
 
 # ---- Comparison ---------------------------------------------------------------
 
+_TOKEN_RE = re.compile(r"[A-Za-z0-9.+\-]+")
+_TOKEN_FINDITER = _TOKEN_RE.finditer
+
+# (threshold, multiplier, suffix), largest unit first; the first threshold reached wins
+CAP_UNITS = ((1e-6, 1e6, "uF"), (1e-9, 1e9, "nF"), (0.0, 1e12, "pF"))  # pF is the catch-all
+IND_TOKENS = ((1e-6, 1e6, "uh"), (1e-9, 1e9, "nh"))  # as written in LCSC descriptions
+# matched against the lower-cased description, where "1MΩ" and "1mΩ" both read "1m"
+RES_TOKENS = ((1e6, 1e-6, "m"), (1e3, 1e-3, "k"), (1.0, 1.0, ""), (1e-3, 1e3, "m"))
+
+def _si(x: float, units, fmt: str = ".0f") -> Optional[str]:
+    """Format x in the first unit whose threshold it reaches; None if below all of them."""
+    for threshold, mult, suffix in units:
+        if x >= threshold:
+            return f"{x * mult:{fmt}}{suffix}"
+    return None
+
 def compare(parsed: ParsedComment, data: Dict[str, Any]) -> Dict[str, Any]:
     issues = []
     matches = []
+    # lower-cased views, computed once
+    desc_l = (data.get("describe") or "").lower()
+    model_l = (data.get("model") or "").lower()
+    brand_l = (data.get("brand") or "").lower()
+    raw_l = (parsed.raw or "").lower()
 
     # Package
     if parsed.package and data.get("package"):
@@ -272,9 +584,7 @@ def compare(parsed: ParsedComment, data: Dict[str, Any]) -> Dict[str, Any]:
             matches.append("capacitance")
         else:
             # make it uF, nF, pF for readability
-            parse_cap_readable = f"{parsed.cap_f*1e6:.0f}uF" if parsed.cap_f >= 1e-6 else (f"{parsed.cap_f*1e9:.0f}nF" if parsed.cap_f >= 1e-9 else f"{parsed.cap_f*1e12:.0f}pF")
-            lcsc_cap_readable = f"{data['cap_f']*1e6:.0f}uF" if data['cap_f'] >= 1e-6 else (f"{data['cap_f']*1e9:.0f}nF" if data['cap_f'] >= 1e-9 else f"{data['cap_f']*1e12:.0f}pF")
-            issues.append(f"capacitance: BOM={parse_cap_readable} vs LCSC={lcsc_cap_readable}")
+            issues.append(f"capacitance: BOM={_si(parsed.cap_f, CAP_UNITS)} vs LCSC={_si(data['cap_f'], CAP_UNITS)}")
 
     if parsed.dielectric and data.get("dielectric"):
         if parsed.dielectric == data["dielectric"]:
@@ -291,32 +601,18 @@ def compare(parsed: ParsedComment, data: Dict[str, Any]) -> Dict[str, Any]:
 
     # Resistor checks (best-effort from 'describe' tokens)
     if parsed.res_ohm is not None:
-        desc = (data.get("describe") or "").lower()
         # try to find the same magnitude token in description
-        ohm_txt = None
-        if parsed.res_ohm >= 1e6:
-            ohm_txt = f"{parsed.res_ohm/1e6:.0f}m"  # "1M" often appears as 1M
-        elif parsed.res_ohm >= 1e3:
-            ohm_txt = f"{parsed.res_ohm/1e3:.0f}k"
-        elif parsed.res_ohm >= 1:
-            ohm_txt = f"{parsed.res_ohm:.0f}"
-        elif parsed.res_ohm >= 1e-3:
-            ohm_txt = f"{parsed.res_ohm*1e3:.0f}m"
-        if ohm_txt and ohm_txt in desc:
+        ohm_txt = _si(parsed.res_ohm, RES_TOKENS)
+        if ohm_txt and ohm_txt in desc_l:
             matches.append("resistance~token")
         else:
             issues.append("resistance: could not confirm from LCSC description")
 
     # Inductor checks
     if parsed.ind_h is not None:
-        desc = (data.get("describe") or "").lower()
         # basic token search μH/nH
-        tok = None
-        if parsed.ind_h >= 1e-6:
-            tok = f"{parsed.ind_h*1e6:g}uh"
-        elif parsed.ind_h >= 1e-9:
-            tok = f"{parsed.ind_h*1e9:g}nh"
-        if tok and tok in desc.replace("μ","u"):
+        tok = _si(parsed.ind_h, IND_TOKENS, "g")
+        if tok and tok in desc_l.replace("μ","u"):
             matches.append("inductance~token")
         else:
             issues.append("inductance: could not confirm from LCSC description")
@@ -324,30 +620,48 @@ def compare(parsed: ParsedComment, data: Dict[str, Any]) -> Dict[str, Any]:
 
     # if the part is not a cap/res/ind, check against the model/brand/describe tokens
     if (parsed.cap_f is None and parsed.res_ohm is None and parsed.ind_h is None):
-        if parsed.raw.lower() in data.get("model").lower() or parsed.raw.lower() in data.get("brand").lower():
+        if raw_l in model_l or raw_l in brand_l:
             matches.append("model/brand")
-        elif parsed.raw.lower() and data.get("describe").lower() and parsed.raw.lower() in data["describe"].lower():
+        elif raw_l and desc_l and raw_l in desc_l:
             matches.append("describe~substring")
         else:
             issues.append("no clear feature match for generic part")
 
+    if matches or issues:
+        # decided by the feature checks; the token fallback below is rarely reached
+        return {
+            "status": "OK" if not issues else ("WARN" if matches else "FAIL"),
+            "matches": ";".join(matches),
+            "issues": "; ".join(issues),
+            "fallback": "",
+        }
+
     # Fallback: token containment if nothing matched and nothing failed hard
-    fallback_note = None
-    if not matches and not issues:
-        bom_tokens = set(re.findall(r"[A-Za-z0-9\.\+\-]+", parsed.raw.lower()))
-        desc_tokens = set(re.findall(r"[A-Za-z0-9\.\+\-]+", (data.get("describe") or "").lower()))
-        inter = bom_tokens & desc_tokens
-        if len(inter) >= max(2, len(bom_tokens)//3):
-            matches.append("token~overlap")
-            fallback_note = f"tokens matched: {sorted(list(inter))[:6]}"
-        else:
-            issues.append("no clear feature match and low token overlap")
-    status = "OK" if issues == [] else ("WARN" if matches else "FAIL")
+    bom_tokens = set(_TOKEN_RE.findall(raw_l))
+    need = max(2, len(bom_tokens)//3)
+    inter = set()
+    # fewer BOM tokens than the threshold can never pass: skip the description scan
+    if len(bom_tokens) >= need:
+        # walk the description lazily, without building its token set, and stop
+        # once every BOM token has been seen (the note lists the sorted overlap)
+        for m in _TOKEN_FINDITER(desc_l):
+            t = m.group()
+            if t in bom_tokens:
+                inter.add(t)
+                if len(inter) == len(bom_tokens):
+                    break
+    if len(inter) >= need:
+        return {
+            "status": "OK",
+            "matches": "token~overlap",
+            "issues": "",
+            "fallback": f"tokens matched: {sorted(list(inter))[:6]}",
+        }
     return {
-        "status": status,
-        "matches": ";".join(matches) if matches else "",
-        "issues": "; ".join(issues) if issues else "",
-        "fallback": fallback_note or "",
+        "status": "FAIL",
+        "matches": "",
+        "issues": "no clear feature match and low token overlap",
+        "fallback": "",
     }
 
 # -----------------------------
@@ -384,6 +698,10 @@ PKG_ALIASES = {
 RE_IMPERIAL = re.compile(r"\b(0201|0402|0603|0805|1206|1210|1812)\b")
 RE_METRIC = re.compile(r"\b(0603|1005|1608|2012|3216|3225|4532)\b")
 RE_METRIC_KICAD = re.compile(r"\b(\d{4})Metric\b", re.IGNORECASE)
+# RE_IMPERIAL/RE_METRIC as set lookups: a \b-delimited code is exactly a whole \w+ word
+IMPERIAL_SET = frozenset(IMPERIAL_TO_METRIC)
+METRIC_SET = frozenset(METRIC_TO_IMPERIAL)
+_WORD_FINDALL = re.compile(r"\w+").findall
 
 # Embedded, but guarded:
 # - optional common prefix letters (C/R/L/D/F) right before the code
@@ -405,8 +723,61 @@ RE_PINS = re.compile(r"\b(\d+)\s*P\b|\b(\d+)\s*pin\b|\b(\d+)\s*pins\b", re.IGNOR
 RE_QFN_PAREN = re.compile(r"\bQFN[- ]?(\d+)\s*\(\s*([0-9.]+)\s*[x×]\s*([0-9.]+)\s*\)", re.IGNORECASE)
 RE_SMD2016 = re.compile(r"\bSMD\s*2016\b", re.IGNORECASE)
 
+# Hyperscan prefilter: one pass over the text tells which of these patterns can
+# match at all; only those then run through `re` for the actual captures.
+# PREFILTER mode accepts the lookarounds (as a superset), so a miss is definitive.
+_SIGNAL_RES = (RE_METRIC_KICAD, RE_IMPERIAL_EMBED, RE_METRIC_EMBED,
+               RE_PINS, RE_QFN_PAREN, RE_LW, RE_DIM_X, RE_PITCH, RE_SMD2016)
+_ALL_SIGNAL_RES = frozenset(_SIGNAL_RES)
+
+def _build_hs_db():
+    if hyperscan is None:
+        return None
+    try:
+        flags = (hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_PREFILTER | hyperscan.HS_FLAG_SINGLEMATCH
+                 | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP)
+        db = hyperscan.Database()
+        db.compile(expressions=[rx.pattern.encode("utf-8") for rx in _SIGNAL_RES],
+                   ids=list(range(len(_SIGNAL_RES))),
+                   elements=len(_SIGNAL_RES),
+                   flags=[flags] * len(_SIGNAL_RES))
+        return db
+    except Exception as e:
+        print(f"Note: hyperscan prefilter disabled ({e})", file=sys.stderr)
+        return None
+
+_HS_DB = _build_hs_db()
+
+# Without hyperscan: literals each pattern cannot match without (text is upper-cased
+# first). Cheap `in` checks rule most patterns out before any regex walks the text.
+_LITERAL_GATES = (
+    (RE_METRIC_KICAD, lambda t: "METR" in t),
+    (RE_IMPERIAL_EMBED, lambda t: any(c in t for c in IMPERIAL_SET)),
+    (RE_METRIC_EMBED, lambda t: any(c in t for c in METRIC_SET)),
+    (RE_PINS, lambda t: "P" in t),
+    (RE_QFN_PAREN, lambda t: "QFN" in t),
+    (RE_LW, lambda t: "L" in t and "W" in t),
+    (RE_DIM_X, lambda t: "X" in t or "×" in t),
+    (RE_PITCH, lambda t: "P" in t),
+    (RE_SMD2016, lambda t: "2016" in t),
+)
 
-@dataclass
+def _signal_hits(text: str):
+    """Patterns from _SIGNAL_RES that may match the upper-cased `text`."""
+    if _HS_DB is None:
+        return {rx for rx, gate in _LITERAL_GATES if gate(text)}
+    hits = set()
+    def on_match(idx, frm, to, flags, ctx):
+        hits.add(_SIGNAL_RES[idx])
+    try:
+        # single-threaded use only: the database owns one scratch space
+        _HS_DB.scan(text.encode("utf-8"), match_event_handler=on_match)
+    except Exception:
+        return _ALL_SIGNAL_RES
+    return hits
+
+
+@dataclass(slots=True)
 class Signals:
     sizes_imperial: Set[str]         # e.g. {"0402"}
     sizes_metric: Set[str]           # e.g. {"1005"}
@@ -415,6 +786,10 @@ class Signals:
     dims_mm: Set[Tuple[float, float]]# e.g. {(7.0, 7.0), (2.0, 1.6)}
     pitches_mm: Set[float]           # e.g. {0.4}
 
+    def is_empty(self) -> bool:
+        return not (self.sizes_imperial or self.sizes_metric or self.family_tokens
+                    or self.pin_counts or self.dims_mm or self.pitches_mm)
+
     def canonical_sizes(self) -> Set[str]:
         """
         Return canonical set of size codes, preferring imperial but keeping both.
@@ -452,17 +827,20 @@ def _norm_family_token(tok: str) -> Optional[str]:
 
 def extract_signals_from_text(text: str) -> Signals:
     text_u = (text or "").upper()
+    hits = _signal_hits(text_u)
 
-    sizes_imp = set(RE_IMPERIAL.findall(text_u))
-    sizes_met = set(RE_METRIC.findall(text_u))
+    words = set(_WORD_FINDALL(text_u))
+    sizes_imp = set(words & IMPERIAL_SET)
+    sizes_met = set(words & METRIC_SET)
 
-    if not sizes_imp:
+    if not sizes_imp and RE_IMPERIAL_EMBED in hits:
         sizes_imp = set(RE_IMPERIAL_EMBED.findall(text_u))
-    if not sizes_met:
+    if not sizes_met and RE_METRIC_EMBED in hits:
         sizes_met = set(RE_METRIC_EMBED.findall(text_u))
     # KiCad style "1005Metric" etc
-    for m in RE_METRIC_KICAD.findall(text_u):
-        sizes_met.add(m)
+    if RE_METRIC_KICAD in hits:
+        for m in RE_METRIC_KICAD.findall(text_u):
+            sizes_met.add(m)
 
     families: Set[str] = set()
     for raw in re.findall(r"[A-Z0-9]+(?:-[A-Z0-9]+)*", text_u):
@@ -471,13 +849,14 @@ def extract_signals_from_text(text: str) -> Signals:
             families.add(fam)
 
     pins: Set[int] = set()
-    for a, b, c in RE_PINS.findall(text_u):
-        n = a or b or c
-        if n:
-            pins.add(int(n))
+    if RE_PINS in hits:
+        for a, b, c in RE_PINS.findall(text_u):
+            n = a or b or c
+            if n:
+                pins.add(int(n))
 
     # QFN-56(7x7)
-    m = RE_QFN_PAREN.search(text_u)
+    m = RE_QFN_PAREN.search(text_u) if RE_QFN_PAREN in hits else None
     dims: Set[Tuple[float, float]] = set()
     if m:
         pins.add(int(m.group(1)))
@@ -485,22 +864,25 @@ def extract_signals_from_text(text: str) -> Signals:
         families.add("QFN")
 
     # L7.0-W7.0 (KiCad custom footprint naming)
-    for lm in RE_LW.finditer(text_u):
-        dims.add((float(lm.group(1)), float(lm.group(2))))
+    if RE_LW in hits:
+        for lm in RE_LW.finditer(text_u):
+            dims.add((float(lm.group(1)), float(lm.group(2))))
 
     # 7x7 patterns in vendor describe/model
-    for dm in RE_DIM_X.finditer(text_u):
-        a, b = float(dm.group(1)), float(dm.group(2))
-        # filter obviously-non-package dims (rare but helps reduce noise)
-        if 0.3 <= a <= 50 and 0.3 <= b <= 50:
-            dims.add((a, b))
+    if RE_DIM_X in hits:
+        for dm in RE_DIM_X.finditer(text_u):
+            a, b = float(dm.group(1)), float(dm.group(2))
+            # filter obviously-non-package dims (rare but helps reduce noise)
+            if 0.3 <= a <= 50 and 0.3 <= b <= 50:
+                dims.add((a, b))
 
     pitches: Set[float] = set()
-    for pm in RE_PITCH.findall(text_u):
-        pitches.add(float(pm))
+    if RE_PITCH in hits:
+        for pm in RE_PITCH.findall(text_u):
+            pitches.add(float(pm))
 
     # Crystal shorthand: SMD2016 implies 2.0 x 1.6 mm
-    if RE_SMD2016.search(text_u):
+    if RE_SMD2016 in hits and RE_SMD2016.search(text_u):
         dims.add((2.0, 1.6))
 
     return Signals(
@@ -513,9 +895,18 @@ def extract_signals_from_text(text: str) -> Signals:
     )
 
 
+@lru_cache(maxsize=1024)
+def _bom_signals(footprint: str) -> Signals:
+    # memoised like parse_comment: footprints repeat across rows; result is read-only
+    return extract_signals_from_text(footprint)
+
+
 def extract_signals(bom_footprint: str, fetched: Dict[str, Any]) -> Tuple[Signals, Signals]:
     # BOM signals: footprint string only (usually strongest)
-    bom_sig = extract_signals_from_text(bom_footprint)
+    bom_sig = _bom_signals(bom_footprint)
+    if bom_sig.is_empty():
+        # nothing to compare against: the fetched side can't change the verdict
+        return bom_sig, Signals(set(), set(), set(), set(), set(), set())
 
     # Fetched signals: combine package/describe/model/attributes values
     parts: List[str] = []
@@ -554,12 +945,64 @@ def _dims_close(d1: Tuple[float, float], d2: Tuple[float, float], tol: float = 0
     return (abs(a1 - a2) <= tol and abs(b1 - b2) <= tol) or (abs(a1 - b2) <= tol and abs(b1 - a2) <= tol)
 
 
-def judge_match(bom_fp: str, fetched: Dict[str, Any]) -> Tuple[str, str]:
+# Grid lookups for the dims/pitch checks: bucket one side on a 2*tol grid, so any
+# value within tol of a probe sits in the probe's cell or a neighbouring one, then
+# confirm with the exact test. O(N+M) instead of comparing every pair.
+def _any_dims_close(ds1: Set[Tuple[float, float]], ds2: Set[Tuple[float, float]], tol: float = 0.15) -> bool:
+    w = 2 * tol
+    grid: Dict[Tuple[int, int], List[Tuple[float, float]]] = {}
+    for d in ds2:
+        grid.setdefault((math.floor(d[0] / w), math.floor(d[1] / w)), []).append(d)
+    for d1 in ds1:
+        ka, kb = math.floor(d1[0] / w), math.floor(d1[1] / w)
+        for ki, kj in ((ka, kb), (kb, ka)):  # L/W may be swapped
+            for i in (ki - 1, ki, ki + 1):
+                for j in (kj - 1, kj, kj + 1):
+                    for d2 in grid.get((i, j), ()):
+                        if _dims_close(d1, d2, tol):
+                            return True
+    return False
+
+
+def _any_pitch_close(ps1: Set[float], ps2: Set[float], tol: float = 0.02) -> bool:
+    w = 2 * tol
+    grid: Dict[int, List[float]] = {}
+    for p2 in ps2:
+        grid.setdefault(math.floor(p2 / w), []).append(p2)
+    for p1 in ps1:
+        k = math.floor(p1 / w)
+        for i in (k - 1, k, k + 1):
+            for p2 in grid.get(i, ()):
+                if abs(p1 - p2) <= tol:
+                    return True
+    return False
+
+
+class _LazyExpl:
+    """Explanation text built on first str(); most verdicts are never printed."""
+    __slots__ = ("_fn", "_s")
+
+    def __init__(self, fn):
+        self._fn = fn
+        self._s = None
+
+    def __str__(self) -> str:
+        if self._s is None:
+            self._s = self._fn()
+        return self._s
+
+    __repr__ = __str__
+
+
+def judge_match(bom_fp: str, fetched: Dict[str, Any]) -> Tuple[str, Any]:
     """
     Return (verdict, explanation).
     verdict ∈ {"MATCH", "MISMATCH", "UNKNOWN"}
+    explanation is a str or a _LazyExpl (format it with str()).
     """
     bom_sig, fet_sig = extract_signals(bom_fp, fetched)
+    if bom_sig.is_empty():
+        return "UNKNOWN", "BOM has no footprint signals"
 
     # 1) Strong check for passive sizes (0201/0402/0603...) if present
     bom_sizes = bom_sig.canonical_sizes()
@@ -568,16 +1011,16 @@ def judge_match(bom_fp: str, fetched: Dict[str, Any]) -> Tuple[str, str]:
     if bom_sizes:
         if fet_sizes:
             if bom_sizes & fet_sizes:
-                return "MATCH", f"Passive size match: BOM {sorted(bom_sizes)} vs fetched {sorted(fet_sizes)}"
+                return "MATCH", _LazyExpl(lambda: f"Passive size match: BOM {sorted(bom_sizes)} vs fetched {sorted(fet_sizes)}")
             else:
-                return "MISMATCH", f"Passive size mismatch: BOM {sorted(bom_sizes)} vs fetched {sorted(fet_sizes)}"
+                return "MISMATCH", _LazyExpl(lambda: f"Passive size mismatch: BOM {sorted(bom_sizes)} vs fetched {sorted(fet_sizes)}")
         else:
             # fetched has no explicit size, but may have metric size
             fet_metric = fet_sig.canonical_metric_sizes()
             bom_metric = bom_sig.canonical_metric_sizes()
             if bom_metric and fet_metric and (bom_metric & fet_metric):
-                return "MATCH", f"Passive metric-size match: BOM {sorted(bom_metric)} vs fetched {sorted(fet_metric)}"
-            return "UNKNOWN", f"BOM indicates passive size {sorted(bom_sizes)} but fetched has no size signal (package/describe/model missing size)"
+                return "MATCH", _LazyExpl(lambda: f"Passive metric-size match: BOM {sorted(bom_metric)} vs fetched {sorted(fet_metric)}")
+            return "UNKNOWN", _LazyExpl(lambda: f"BOM indicates passive size {sorted(bom_sizes)} but fetched has no size signal (package/describe/model missing size)")
 
     # 2) For IC/connector packages: use family+pins+dims/pitch when available
     bom_fam = bom_sig.family_tokens
@@ -594,24 +1037,12 @@ def judge_match(bom_fp: str, fetched: Dict[str, Any]) -> Tuple[str, str]:
     # dims check if both have dims
     dim_hit = False
     if bom_sig.dims_mm and fet_sig.dims_mm:
-        for d1 in bom_sig.dims_mm:
-            for d2 in fet_sig.dims_mm:
-                if _dims_close(d1, d2):
-                    dim_hit = True
-                    break
-            if dim_hit:
-                break
+        dim_hit = _any_dims_close(bom_sig.dims_mm, fet_sig.dims_mm)
 
     # pitch check if both have pitch
     pitch_hit = False
     if bom_sig.pitches_mm and fet_sig.pitches_mm:
-        for p1 in bom_sig.pitches_mm:
-            for p2 in fet_sig.pitches_mm:
-                if abs(p1 - p2) <= 0.02:
-                    pitch_hit = True
-                    break
-            if pitch_hit:
-                break
+        pitch_hit = _any_pitch_close(bom_sig.pitches_mm, fet_sig.pitches_mm)
 
     # decision logic:
     # - If we have at least two independent confirming signals => MATCH
@@ -630,38 +1061,49 @@ def judge_match(bom_fp: str, fetched: Dict[str, Any]) -> Tuple[str, str]:
     # If BOM looks like it encodes a very specific package name and fetched describe is generic,
     # avoid false mismatches.
     if contradicts >= 1 and confirms == 0:
-        return "MISMATCH", (
+        return "MISMATCH", _LazyExpl(lambda: (
             f"No match signals and at least one contradiction. "
             f"BOM fam={sorted(bom_fam)} pins={sorted(bom_sig.pin_counts)} dims={sorted(bom_sig.dims_mm)} pitch={sorted(bom_sig.pitches_mm)} "
             f"vs fetched fam={sorted(fet_fam)} pins={sorted(fet_sig.pin_counts)} dims={sorted(fet_sig.dims_mm)} pitch={sorted(fet_sig.pitches_mm)}"
-        )
+        ))
 
     if confirms >= 2:
-        return "MATCH", (
+        return "MATCH", _LazyExpl(lambda: (
             f"Confirmed by {confirms} signals (family/pins/dims/pitch). "
             f"BOM fam={sorted(bom_fam)} pins={sorted(bom_sig.pin_counts)} dims={sorted(bom_sig.dims_mm)} pitch={sorted(bom_sig.pitches_mm)} "
             f"vs fetched fam={sorted(fet_fam)} pins={sorted(fet_sig.pin_counts)} dims={sorted(fet_sig.dims_mm)} pitch={sorted(fet_sig.pitches_mm)}"
-        )
+        ))
 
     # weak single-signal match: treat as UNKNOWN unless it's a family+pins exact
     if fam_hit and pin_hit:
-        return "MATCH", f"Family+pin match: fam={sorted(bom_fam & fet_fam)} pins={sorted(bom_sig.pin_counts & fet_sig.pin_counts)}"
+        return "MATCH", _LazyExpl(lambda: f"Family+pin match: fam={sorted(bom_fam & fet_fam)} pins={sorted(bom_sig.pin_counts & fet_sig.pin_counts)}")
 
-    s = ("Fam:" + f"{sorted(bom_fam)}" + "/" + f"{sorted(fet_fam)}" if (bom_fam or fet_fam) else "") + \
+    def summary() -> str:
+        return ("Fam:" + f"{sorted(bom_fam)}" + "/" + f"{sorted(fet_fam)}" if (bom_fam or fet_fam) else "") + \
         (" Pins:" + f"{sorted(bom_sig.pin_counts)}" + "/" + f"{sorted(fet_sig.pin_counts)}" if (bom_sig.pin_counts or fet_sig.pin_counts) else "") + \
         (" Dims:" + f"{sorted(bom_sig.dims_mm)}" + "/" + f"{sorted(fet_sig.dims_mm)}" if (bom_sig.dims_mm or fet_sig.dims_mm) else "") + \
         (" Pitch:" + f"{sorted(bom_sig.pitches_mm)}" + "/" + f"{sorted(fet_sig.pitches_mm)}" if (bom_sig.pitches_mm or fet_sig.pitches_mm) else "") 
     if confirms == 1:
-        return "UNKNOWN", (
-            f"WEAK match: " + s
-        )
+        return "UNKNOWN", _LazyExpl(lambda: (
+            f"WEAK match: " + summary()
+        ))
 
-    return "UNKNOWN", (
-        f"MISSING info: " + s
-    )
+    return "UNKNOWN", _LazyExpl(lambda: (
+        f"MISSING info: " + summary()
+    ))
 
 # ---- Main ---------------------------------------------------------------------
 
+def _fetch_ahead(items: Iterable[Any], submit, window: int):
+    """Yield (item, submit(item)) in input order, keeping at most `window` submissions in flight."""
+    q = deque()
+    for item in items:
+        q.append((item, submit(item)))
+        if len(q) > window:
+            yield q.popleft()
+    while q:
+        yield q.popleft()
+
 def find_col(header: list[str], candidates: list[str]) -> Optional[int]:
     low = [h.strip().lower() for h in header]
     for cand in candidates:
@@ -676,10 +1118,21 @@ def main():
     ap.add_argument("--out", default="bom_check_report.csv", help="Output CSV report")
     ap.add_argument("--cache", default=".lcsc_cache", help="Directory for API JSON cache")
     ap.add_argument("--force-fetch", action="store_true", help="Ignore cache and re-fetch all parts")
+    ap.add_argument("--cache-ttl", type=float, default=0.0, help="Re-fetch cached parts older than this many days (0: never)")
+    ap.add_argument("--cache-stats", action="store_true", help="Print hit/miss counts of the in-memory parse caches")
     ap.add_argument("--timeout", type=float, default=10.0, help="HTTP timeout seconds")
-    ap.add_argument("--rate", type=float, default=40.0, help="Max requests per second (basic sleep pacing)")
+    ap.add_argument("--rate", type=float, default=40.0, help="Max requests per second (token bucket, bursts up to the rate)")
     args = ap.parse_args()
+    try:
+        run_check(args)
+    finally:
+        if _SESSION is not None:
+            _SESSION.close()
+
+LARGE_BOM_BYTES = 50 * 1024 * 1024
+REPORT_FLUSH_ROWS = 64
 
+def run_check(args) -> None:
     bom_path = Path(args.bom_csv)
     if not bom_path.exists():
         print(f"ERROR: BOM file not found: {bom_path}", file=sys.stderr)
@@ -691,12 +1144,15 @@ def main():
         print(f"ERROR: offline-json-dir not a directory: {offline_dir}", file=sys.stderr)
         sys.exit(2)
 
-    rows = list(csv.reader(bom_path.open(newline="", encoding="utf-8-sig")))
-    if not rows:
+    # stream the BOM: rows are read, fetched and reported one at a time; large
+    # files get a bigger read buffer so the sequential scan makes fewer read() calls
+    big = bom_path.stat().st_size > LARGE_BOM_BYTES
+    fh = bom_path.open(newline="", encoding="utf-8-sig", buffering=(1 << 20) if big else -1)
+    reader = csv.reader(fh)
+    header = next(reader, None)
+    if header is None:
         print("ERROR: empty CSV", file=sys.stderr)
         sys.exit(2)
-    header = rows[0]
-    body = rows[1:]
 
     idx_lcsc = find_col(header, ["lcsc", "lcsc#", "lcsc code", "lcsc_code"])
     idx_comment = find_col(header, ["comment", "comments", "value"])
@@ -721,135 +1177,174 @@ def main():
         "Status","RefDes","Qty","LCSC","BOM_Comment",
         "LCSC_Package","LCSC_Describe","Matched","Issues","FallbackNote"
     ]
-    out_rows = [report_hdr]
 
-    last_t = 0.0
     if offline_dir == None and args.rate > 4:
         print("Note: offline-json-dir is set; ignoring --rate > 4", file=sys.stderr)
         args.rate = 4.0
-    min_dt = 1.0 / max(args.rate, 0.001)
+    bucket = TokenBucket(args.rate, capacity=max(1, int(args.rate)))
+    workers = int(max(1, min(16, args.rate)))
+    cache = LcscCache(cache_dir, ttl=args.cache_ttl * 86400) if cache_dir else None
+    refresh = offline_dir is None  # --force-fetch: write the cache but don't read it
+
+    prefetched: Dict[str, Dict[str, Any]] = {}
+    if aiohttp is not None:
+        # extra pass over the LCSC column: uncached codes are fetched concurrently up front
+        todo = {}
+        for r in reader:
+            code = (r[idx_lcsc] or "").strip() if idx_lcsc < len(r) else ""
+            if code and (cache is None or refresh or not cache.has(code)):
+                todo[code] = None
+        fh.seek(0)
+        reader = csv.reader(fh)
+        next(reader)  # header
+        if todo:
+            prefetched = asyncio.run(prefetch_all(todo, args.timeout, bucket, cache=cache))
+    elif offline_dir is None and _SESSION is not None:
+        _prewarm(_SESSION, args.timeout)  # every row goes to the network
+
+    def bom_rows():
+        for r in reader:
+            # guard against ragged rows
+            r = r + [""] * (len(header) - len(r))
+            lcsc_code = (r[idx_lcsc] or "").strip()
+            comment = (r[idx_comment] or "").strip()
+            footprint = (r[idx_footprint] or "").strip() if idx_footprint is not None else ""
+            refdes = (r[idx_ref] or "").strip() if idx_ref is not None else ""
+            qty = (r[idx_qty] or "").strip() if idx_qty is not None else ""
+            yield lcsc_code, comment, footprint, refdes, qty
+
+    # colour only on a terminal, and never when NO_COLOR is set (https://no-color.org)
+    use_color = sys.stdout.isatty() and not os.environ.get("NO_COLOR")
+    GREEN, RED, YEL, RST = ("\033[92m", "\033[91m", "\033[93m", "\033[0m") if use_color else ("",) * 4
+    stock_w = 17 + len(GREEN) + len(RST)  # 17 visible columns either way
 
+    out_path = Path(args.out)
+    counts: Counter = Counter()
     total_price = 0.0
-    for r in body:
-        # guard against ragged rows
-        r = r + [""] * (len(header) - len(r))
-        lcsc_code = (r[idx_lcsc] or "").strip()
-        comment = (r[idx_comment] or "").strip()
-        footprint = (r[idx_footprint] or "").strip() if idx_footprint is not None else ""
-        refdes = (r[idx_ref] or "").strip() if idx_ref is not None else ""
-        qty = (r[idx_qty] or "").strip() if idx_qty is not None else ""
-
-        if not lcsc_code:
-            out_rows.append(["N/A", refdes, qty, "", comment, "", "", "", "no LCSC", ""])
-            continue
-
-        # crude pacing
-        now = time.time()
-        if now - last_t < min_dt:
-            time.sleep(min_dt - (now - last_t))
-        last_t = time.time()
-
-        fetched = fetch_lcsc(lcsc_code, timeout=args.timeout, cache_dir=cache_dir, offline_json_dir=offline_dir)
-        if not fetched.get("success"):
-            out_rows.append(["FAIL", refdes, qty, lcsc_code, comment, "", "", "", f"fetch error: {fetched.get('msg')}", ""])
-            print(f"Warning: LCSC fetch failed for {lcsc_code}: {fetched.get('msg')}", file=sys.stderr)
-            continue
+    infos: Dict[str, Dict[str, Any]] = {}  # lcsc code -> lcsc_describe() result
+    # rows stream through csv.writer; flushed every REPORT_FLUSH_ROWS rows so an
+    # interrupted run still leaves most finished rows behind (the with-block
+    # flushes the rest, on errors too)
+    with (fh, out_path.open("w", newline="", encoding="utf-8") as outf,
+          ThreadPoolExecutor(max_workers=workers) as pool):
+        w = csv.writer(outf)
+        w.writerow(report_hdr)
+
+        def put(row: List[Any]) -> None:
+            w.writerow(row)
+            counts[row[0]] += 1
+            if counts.total() % REPORT_FLUSH_ROWS == 0:
+                outf.flush()
+
+        # I/O-bound fetches run a bounded window ahead on the pool; rows are
+        # judged on this thread in BOM order as their fetches complete.
+        # Rows repeating a code share the first row's future, so each unique
+        # code is fetched (and rate-limited) once.
+        fetches: Dict[str, Future] = {}
+
+        def submit(row):
+            if not row[0]:
+                return None
+            fut = fetches.get(row[0])
+            if fut is not None:
+                return fut
+            if row[0] in prefetched:
+                fut = Future()
+                fut.set_result(prefetched[row[0]])
+            else:
+                fut = pool.submit(fetch_lcsc, row[0], timeout=args.timeout, session=_SESSION,
+                                  bucket=bucket, cache=cache, refresh=refresh)
+            fetches[row[0]] = fut
+            return fut
+
+        for (lcsc_code, comment, footprint, refdes, qty), fut in _fetch_ahead(bom_rows(), submit, 4 * workers):
+            if not lcsc_code:
+                put(["N/A", refdes, qty, "", comment, "", "", "", "no LCSC", ""])
+                continue
 
-        info = lcsc_describe(fetched["data"])
-
-        # print("")
-        # # print(info)
-        # print(f"BOM: {footprint}")
-        # print(f"Fetched LCSC {lcsc_code}: {info}")
-        # print("")
-        # print(f"Package match verdict: {verdict} ({why})")
-        
-        parsed = parse_comment(comment)
-        cmpres = compare(parsed, info)
-        verdict, why = judge_match(footprint, info)
-        cmpres["why"] = why
-        if cmpres["status"] == "OK" and verdict == "MATCH":
-            cmpres["status"] = "OK"
-        elif cmpres["status"] == "FAIL" or verdict == "MISMATCH":
-            cmpres["status"] = "FAIL"
-            if verdict == "MISMATCH":
-                cmpres["issues"] = "Package "
-        if verdict == "UNKNOWN":
-            cmpres["warn"] = "WARN"
-        # get parts quality, price and stock info
-        # print(f"qty in design: {qty}")
-        # if "initialPrice" in fetched["data"]:
-        price = float(fetched["data"]["data"].get("initialPrice"))
-        stock = int(fetched["data"]["data"].get("stockCount"))
-        qty = int(qty) if qty.isdigit() else 1
-
-        # print(f"{parsed.raw} ({lcsc_code}):\t", end="")
-        # align output: part name (<10char or padded) + LCSC code (10char) + status
-        pname = parsed.raw if len(parsed.raw) <= 13 else (parsed.raw[:11] + "..")
-        print(f"{pname:13} {lcsc_code:12} ", end="")
-        if cmpres["status"] == "OK":
-            ma = cmpres["matches"] if len(cmpres["matches"]) <= 11 else (cmpres["matches"][:11])
-            print(f"\033[92mMATCH\033[0m {ma:11}", end="")
-        if cmpres["status"] == "FAIL":
-            # print FAIL in red
-            print(f"\033[91mMISMATCH\033[0m {cmpres["issues"]}", end="")
-            # print(f"  LCSC : {info}")
-
-        stock_str = ""
-        if stock == 0:
-            stock_str = "\033[91mOUT OF STOCK\033[0m"
-        elif stock < qty:
-            stock_str="\033[93mLOW STOCK\033[0m"
-        else:
-            stock_str=f"\033[92m{stock}\033[0m in stock"
-
-        print(f" | {stock_str:26} ", end="")
-        
-        print(f" | {price:6}$ each", end="")
-
-        print(f" | ", end="")
-        if cmpres["status"] == "FAIL":
-            print(cmpres["why"], end="")
-        if "warn" in cmpres:
-            print(why, end="")
-        
-        print("")
-
-
-
-        out_rows.append([
-            cmpres["status"],
-            refdes,
-            qty,
-            lcsc_code,
-            comment,
-            info.get("package") or "",
-            (info.get("describe") or "")[:160],
-            cmpres["matches"],
-            cmpres["issues"],
-            cmpres["fallback"],
-        ])
+            fetched = fut.result()
+            if not fetched.get("success"):
+                put(["FAIL", refdes, qty, lcsc_code, comment, "", "", "", f"fetch error: {fetched.get('msg')}", ""])
+                print(f"Warning: LCSC fetch failed for {lcsc_code}: {fetched.get('msg')}", file=sys.stderr)
+                continue
 
-        total_price += price * qty
+            info = infos.get(lcsc_code)
+            if info is None:
+                info = infos[lcsc_code] = lcsc_describe(fetched["data"])
+
+            # print("")
+            # # print(info)
+            # print(f"BOM: {footprint}")
+            # print(f"Fetched LCSC {lcsc_code}: {info}")
+            # print("")
+            # print(f"Package match verdict: {verdict} ({why})")
+
+            parsed = parse_comment(comment)
+            cmpres = compare(parsed, info)
+            verdict, why = judge_match(footprint, info)
+            # row fields are settled once here and shared by the console line and the CSV row
+            status, matches, issues = cmpres["status"], cmpres["matches"], cmpres["issues"]
+            if status == "FAIL" or verdict == "MISMATCH":
+                status = "FAIL"
+                if verdict == "MISMATCH":
+                    issues = "Package "
+            # get parts quality, price and stock info
+            part = fetched["data"]["data"]
+            # missing/null price or stock must not abort the run: count them as 0
+            price = part.get("initialPrice")
+            price = float(price) if price not in (None, "") else 0.0
+            stock = part.get("stockCount")
+            stock = int(stock) if stock not in (None, "") else 0
+            qty = int(qty) if qty.isdigit() else 1
+
+            # align output: part name (<10char or padded) + LCSC code (10char) + status
+            # the console line is assembled first and written once
+            pname = parsed.raw if len(parsed.raw) <= 13 else (parsed.raw[:11] + "..")
+            line = [f"{pname:13} {lcsc_code:12} "]
+            if status == "OK":
+                line.append(f"{GREEN}MATCH{RST} {matches[:11]:11}")
+            elif status == "FAIL":
+                # print FAIL in red
+                line.append(f"{RED}MISMATCH{RST} {issues}")
+
+            if stock == 0:
+                stock_str = f"{RED}OUT OF STOCK{RST}"
+            elif stock < qty:
+                stock_str = f"{YEL}LOW STOCK{RST}"
+            else:
+                stock_str = f"{GREEN}{stock}{RST} in stock"
 
+            line.append(f" | {stock_str:{stock_w}} ")
+            line.append(f" | {price:6}$ each")
+            line.append(" | ")
+            if status == "FAIL":
+                line.append(str(why))
+            if verdict == "UNKNOWN":
+                line.append(str(why))
+            line.append("\n")
+            sys.stdout.write("".join(line))
 
+            put([status, refdes, qty, lcsc_code, comment,
+                 info.get("package") or "", (info.get("describe") or "")[:160],
+                 matches, issues, cmpres["fallback"]])
 
-        
+            total_price += price * qty
 
-    out_path = Path(args.out)
-    with out_path.open("w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerows(out_rows)
+    if cache is not None:
+        cache.close()
 
     # Console summary
-    total = len(out_rows) - 1
-    ok = sum(1 for r in out_rows[1:] if r[0] == "OK")
-    warn = sum(1 for r in out_rows[1:] if r[0] == "WARN")
-    fail = sum(1 for r in out_rows[1:] if r[0] == "FAIL")
-    na = sum(1 for r in out_rows[1:] if r[0] == "N/A")
-    print(f"Checked {total} rows → OK={ok}, WARN={warn}, FAIL={fail}, N/A={na}")
+    total = sum(counts.values())
+    print(f"Checked {total} rows → OK={counts['OK']}, WARN={counts['WARN']}, FAIL={counts['FAIL']}, N/A={counts['N/A']}")
     print(f"Wrote: {out_path}")
     print(f"Estimated total price (at qty): ${total_price:.2f} (without shipping/tax)")
+    if args.cache_stats:
+        for fn in (parse_comment, _bom_signals):
+            ci = fn.cache_info()
+            calls = ci.hits + ci.misses
+            rate = f"{100.0 * ci.hits / calls:.0f}%" if calls else "n/a"
+            print(f"{fn.__name__} cache: {ci.hits} hits, {ci.misses} misses ({rate}), "
+                  f"{ci.currsize}/{ci.maxsize} entries")
 
 if __name__ == "__main__":
     main()